@@ -1,105 +1,643 @@
-from flask import Flask, render_template, request, redirect, flash, jsonify, url_for
-import json   # For encoding and decoding JSON data.
+from flask import Flask, render_template, request, redirect, flash, jsonify, url_for, Response, stream_with_context, make_response
+from flask import session as flask_session   # Renamed: `session` below is the BaaS HTTP session
+from flask.json.provider import JSONProvider   # Hook for swapping Flask's JSON implementation
+import orjson   # Fast JSON encoding and decoding.
+import json     # For the rare callers that need stdlib-only behaviour (object_hook, integers beyond 64 bits)
+from cachetools import TTLCache   # Short-lived cache of verification results
 import os     # Access environment variables
+import logging     # Leveled, lazily-formatted logs instead of print()
+import sqlite3     # Persistent song storage shared by all workers
+import time        # Row modification times
+import hashlib     # ETag for the song list
+import queue       # Per-browser event queues for /events
+import threading   # Lock around the shared songs storage
+import uuid        # Collision-free tracking IDs
+from concurrent.futures import ThreadPoolExecutor   # Background pool for outbound BaaS calls
 import requests    # To send HTTP requests to the BaaS API
+from requests.adapters import HTTPAdapter   # Connection pooling for the shared BaaS session
+from urllib3.util.retry import Retry        # Retry policy for transient BaaS errors
 from dotenv import load_dotenv   #Loads .env file for secret configuration
 from datetime import datetime, timezone     # Used for timestamps in UTC.
+from contextlib import contextmanager       # For the read-modify-write helper around a song row
+from jinja2 import FileSystemBytecodeCache   # Reuse compiled templates across workers/restarts
 
 load_dotenv()
 
+# LOG_LEVEL=DEBUG shows full webhook/verification payloads; at the default INFO they are never even formatted.
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson (used by request.get_json, jsonify and the tojson filter)."""
+
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NON_STR_KEYS
+        if kwargs.get("indent"):       # tojson(indent=2) in the verify template
+            option |= orjson.OPT_INDENT_2
+        if kwargs.get("sort_keys"):
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        # Flask's session serializer passes object_hook to rebuild tagged values (flash tuples, Markup...);
+        # orjson has no hooks, so those calls go through the stdlib.
+        if kwargs:
+            return json.loads(s, **kwargs)
+        return orjson.loads(s)
+
+
 app = Flask(__name__)  #Initializes Flask app.
+app.json = OrjsonProvider(app)   # Webhooks and verify results go through orjson instead of the stdlib json module.
 app.secret_key = os.getenv('FLASK_SECRET_KEY', 'fallback-secret-for-dev-only')   # Loads secret key for session management and flash messages.
 
+# Templates don't change while the app runs: skip the per-render file stat and keep compiled templates on disk,
+# so new workers load bytecode instead of re-parsing the HTML.
+# Without JINJA_CACHE_DIR, Jinja uses its own private per-user (0700, owner-checked) temp directory; a custom
+# directory must not be writable by other users, since its contents are loaded as code.
+JINJA_CACHE_DIR = os.getenv("JINJA_CACHE_DIR")
+app.config.update(TEMPLATES_AUTO_RELOAD=False)
+app.jinja_env.auto_reload = False
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(JINJA_CACHE_DIR)   # None -> Jinja's safe default
+
 # BaaS API Configuration
 BLOCKAPI_BASE_URL = os.getenv("BLOCKAPI_BASE_URL", "https://blockapi.co.za/api/v1")
 BLOCKAPI_API_KEY = os.getenv("BLOCKAPI_API_KEY")    # API key for authentication
 WEBHOOK_URL = os.getenv("WEBHOOK_URL")      # Where the BaaS platform will POST blockchain notifications.
+TASK_URL = f"{BLOCKAPI_BASE_URL}/blockchainTask"                   # Submit data to be written on-chain
+VERIFY_URL = f"{BLOCKAPI_BASE_URL}/blockchainTransaction/verify"   # Verify a transaction against its payload/hash
+
+# Algorand addresses are 58 characters of base32 (A-Z, 2-7).
+ALGORAND_ADDRESS_LENGTH = 58
+_ALGO_CHARS = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZ234567")
+
+# One shared HTTP session for every BaaS call.
+# Keep-alive reuses the TCP/TLS connection to blockapi.co.za instead of doing a new handshake per form submission.
+# The auth headers are attached once here, so the individual requests don't need to rebuild them.
+adapter = HTTPAdapter(
+    pool_connections=50,
+    pool_maxsize=50,
+    # Every BaaS call is a POST, which urllib3 leaves out of its default allowed_methods: only connection failures
+    # (the request never reached BaaS) are retried. 502/503/504 answers are not, so a song is never submitted twice.
+    max_retries=Retry(total=3, backoff_factor=0.2, status_forcelist=[502, 503, 504]),
+)
+session = requests.Session()
+session.mount("https://", adapter)
+session.headers.update({
+    "X-API-Key": BLOCKAPI_API_KEY,
+    "Content-Type": "application/json"
+})
+
+# (connect, read) timeouts for BaaS calls: a dead handshake fails in ~3s instead of holding a thread for 30s.
+# Connection failures (incl. connect timeouts) are retried by the adapter above; read timeouts and 5xx answers are not.
+BAAS_TIMEOUT = (3.05, 10)
+
+# Largest slice of an error body we read back for messages/logs.
+ERROR_SNIPPET_BYTES = 2048
+
+
+def _error_snippet(response):
+    """Read at most ERROR_SNIPPET_BYTES of a streamed error response instead of buffering the whole body."""
+    return response.raw.read(ERROR_SNIPPET_BYTES, decode_content=True).decode("utf-8", errors="replace")
+
+# Recent verification results, keyed by (transaction ID, payload, hash).
+# Users often refresh or re-submit the same verification; those are answered from memory for VERIFY_CACHE_TTL seconds.
+VERIFY_CACHE_TTL = 300
+verify_cache = TTLCache(maxsize=1024, ttl=VERIFY_CACHE_TTL)
+verify_cache_lock = threading.Lock()   # TTLCache isn't thread-safe on its own
+
+# Dedicated pool for BaaS I/O so the browser never waits on the upstream POST.
+# Only network-bound work goes here; the webhook still confirms the final on-chain status.
+BAAS_IO_WORKERS = int(os.getenv("BAAS_IO_WORKERS", "8"))
+baas_executor = ThreadPoolExecutor(max_workers=BAAS_IO_WORKERS, thread_name_prefix="blockapi_io")
+
+# Persistent storage for registered songs.
+# SQLite in WAL mode survives restarts and is shared by every gunicorn worker on the instance,
+# so a webhook can update a song no matter which worker registered it.
+# Each row keeps the song dictionary as JSON, with a unique index on data_id for O(1)-style lookups.
+SONGS_DB_PATH = os.getenv("SONGS_DB_PATH", "songs.db")
+SONGS_PAGE_SIZE = 100   # Most recent songs shown on the index page
+
+
+def _connect_db():
+    """Open the songs database (autocommit mode, WAL journal) and create the table on first run."""
+    conn = sqlite3.connect(SONGS_DB_PATH, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")      # Readers don't block the writer (and vice versa)
+    conn.execute("PRAGMA synchronous=NORMAL")    # Safe with WAL, far fewer fsyncs
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS songs ("
+        "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "data_id TEXT NOT NULL UNIQUE, "
+        "doc TEXT NOT NULL, "
+        "updated_at REAL NOT NULL)"
+    )
+    return conn
+
+
+db = _connect_db()
+# Handlers and the BaaS pool share one connection per process, so every query goes through this lock.
+songs_lock = threading.RLock()
+
+
+def _row_to_song(row):
+    """Turn an (id, doc) row back into the song dictionary the templates expect."""
+    song = orjson.loads(row[1])
+    song["id"] = row[0]
+    return song
+
+
+def add_song(song):
+    """Insert a new song and return it with its local id filled in."""
+    with songs_lock:
+        cursor = db.execute(
+            "INSERT INTO songs (data_id, doc, updated_at) VALUES (?, ?, ?)",
+            (song["data_id"], orjson.dumps(song).decode(), time.time()),
+        )
+    return dict(song, id=cursor.lastrowid)
+
+
+def list_songs(limit=SONGS_PAGE_SIZE):
+    """Return (total song count, the newest `limit` songs) in a single locked read."""
+    with songs_lock:
+        total = db.execute("SELECT COUNT(*) FROM songs").fetchone()[0]
+        rows = db.execute("SELECT id, doc FROM songs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+    return total, [_row_to_song(row) for row in rows]
+
+
+def songs_etag():
+    """Short fingerprint of the song list that changes whenever a song is added or updated."""
+    with songs_lock:
+        count, last_change = db.execute("SELECT COUNT(*), MAX(updated_at) FROM songs").fetchone()
+    return hashlib.blake2b(f"{count}:{last_change}".encode(), digest_size=8).hexdigest()
+
+
+def claim_expired_songs(lease_seconds):
+    """Take over 'queued' songs whose submission lease has run out, giving them a fresh lease; returns them.
+
+    Each queued song carries a lease_until time that its process keeps renewing while the song waits in memory.
+    An expired lease means that process restarted or crashed, so nobody else will ever send the song.
+    """
+    now = time.time()
+    with songs_lock:
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            rows = db.execute(
+                "SELECT id, doc FROM songs WHERE json_extract(doc, '$.status') = 'queued' "
+                "AND COALESCE(json_extract(doc, '$.lease_until'), 0) < ?",
+                (now,),
+            ).fetchall()
+            db.executemany(
+                "UPDATE songs SET doc = json_set(doc, '$.lease_until', ?) WHERE id = ?",
+                [(now + lease_seconds, row[0]) for row in rows],
+            )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+    return [_row_to_song(row) for row in rows]
+
+
+def renew_leases(data_ids, lease_seconds):
+    """Extend the lease on songs this process still has waiting to be sent."""
+    until = time.time() + lease_seconds
+    with songs_lock:
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.executemany(
+                "UPDATE songs SET doc = json_set(doc, '$.lease_until', ?) "
+                "WHERE data_id = ? AND json_extract(doc, '$.status') = 'queued'",
+                [(until, data_id) for data_id in data_ids],
+            )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+
+@contextmanager
+def editing_song(data_id):
+    """Load a song for read-modify-write; yields None if it doesn't exist, and saves changes when the block exits.
+
+    BEGIN IMMEDIATE takes SQLite's write lock up front, so two workers can't interleave updates to the same row.
+    """
+    with songs_lock:
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute("SELECT id, doc FROM songs WHERE data_id = ?", (data_id,)).fetchone()
+            song = _row_to_song(row) if row else None
+            yield song
+            if song is not None:
+                db.execute(
+                    "UPDATE songs SET doc = ?, updated_at = ? WHERE data_id = ?",
+                    (orjson.dumps(song).decode(), time.time(), data_id),
+                )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+
+# Live status updates (Server-Sent Events)
+# Each open browser tab gets its own queue; status changes are pushed into every queue,
+# so pages update on block confirmation without polling the server.
+# Note: subscribers are per process, so events reach browsers connected to the worker that handled the change.
+SSE_KEEPALIVE_SECONDS = 15   # Comment line sent when idle, so proxies keep the stream open and dead clients get noticed
+SSE_QUEUE_SIZE = 100         # Events buffered per browser before we start dropping them for that browser
+_subscribers = set()
+_subscribers_lock = threading.Lock()
+
+
+def publish_song_update(song):
+    """Push a song's current status to every connected /events stream."""
+    event = orjson.dumps({
+        "data_id": song.get("data_id"),
+        "status": song.get("status"),
+        "blockchain_tx_id": song.get("blockchain_tx_id"),
+    }).decode()
+    with _subscribers_lock:
+        for subscriber in _subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:   # That browser isn't reading; it will catch up on its next page load
+                pass
+
+
+@app.route("/events")
+def events():
+    """Stream song status changes to the browser as text/event-stream."""
+    def stream():
+        subscriber = queue.Queue(maxsize=SSE_QUEUE_SIZE)
+        with _subscribers_lock:
+            _subscribers.add(subscriber)
+        try:
+            # Send something straight away so the server flushes the headers and the browser's EventSource opens now,
+            # rather than on the first keep-alive; also tells the browser how long to wait before reconnecting.
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event = subscriber.get(timeout=SSE_KEEPALIVE_SECONDS)
+                    yield f"event: song\ndata: {event}\n\n"
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+        finally:   # Browser went away
+            with _subscribers_lock:
+                _subscribers.discard(subscriber)
+
+    return Response(
+        stream_with_context(stream()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-# Simple in-memory storage for registered songs (in production, use a database)
-# This is a Python list in memory. While the Flask app is running, the songs list exists in RAM.
-# Every element is a dictionary containing song info. 
-# If your app restarts or redeploys, the list is cleared.
-songs = []
 
 @app.route("/")
 def index():
     """View all registered songs"""
-    return render_template("index.html", songs=songs) # passes the current songs list to display all registered songs.
+    # If the browser already has this exact song list, answer 304 and skip the query + template render.
+    # Pages carrying flash messages are always rendered fresh and never cached, so messages aren't lost or replayed.
+    etag = songs_etag()
+    has_flashes = "_flashes" in flask_session
+    if not has_flashes and request.if_none_match.contains(etag):
+        return "", 304
+
+    total, recent_songs = list_songs()
+    response = make_response(render_template("index.html", songs=recent_songs, total=total)) # passes the newest songs (and the overall count) to display.
+    if not has_flashes:
+        response.set_etag(etag)
+        response.cache_control.max_age = 0
+        response.cache_control.must_revalidate = True
+    return response
+
+
+def submit_to_baas(data_id, payload):
+    """Send a queued song to the BaaS API (runs on the blockapi_io pool) and record the outcome on the song."""
+    settled = False   # Set once the song has been marked pending/failed
+    try:
+        # Send request to correct BaaS API endpoint (auth headers come from the shared session)
+        # stream=True: the body is only read when we actually need it
+        with session.post(
+            TASK_URL,
+            data=orjson.dumps(payload),   # Content-Type comes from the session headers
+            timeout=BAAS_TIMEOUT,
+            stream=True
+        ) as response:
+
+            # Handle response
+            if response.status_code in [200, 201]:  # Accept both 200 and 201 as success
+                # Parse the response to get BaaS task ID; an unexpected body shape still counts as accepted
+                try:
+                    response_data = orjson.loads(response.content)
+                except orjson.JSONDecodeError:
+                    response_data = None
+                task = response_data.get('data') if isinstance(response_data, dict) else None
+                _mark_submitted(data_id, task.get('id') if isinstance(task, dict) else None)
+            else:
+                _mark_failed(data_id)
+                app.logger.warning("BaaS rejected song %s: %s - %s", data_id, response.status_code, _error_snippet(response))
+            settled = True
+
+    except requests.RequestException as e:   # Network trouble; anything else is a bug and is logged by _log_task_failure
+        _mark_failed(data_id)
+        settled = True
+        app.logger.warning("Network error submitting song %s: %s", data_id, e)
+
+    finally:
+        # Never leave a song 'queued' after an unexpected error: it would otherwise be swept up and sent again.
+        if not settled:
+            _mark_failed_quietly(data_id)
+
+
+def _mark_submitted(data_id, baas_task_id):
+    """Record the BaaS task ID for a song the BaaS API accepted."""
+    _settled(data_id)
+    with editing_song(data_id) as song:
+        if song:
+            song['baas_task_id'] = baas_task_id
+            # The webhook may already have confirmed the song, so only move it out of 'queued'.
+            if song.get('status') == 'queued':
+                song['status'] = 'pending'
+    if song:
+        publish_song_update(song)
+    app.logger.info("Queued song %s as BaaS task %s", data_id, baas_task_id)
+
+
+def _mark_failed(data_id, only_if_queued=False):
+    """Flag a song whose BaaS submission didn't go through."""
+    _settled(data_id)
+    with editing_song(data_id) as song:
+        if song and only_if_queued and song.get('status') != 'queued':
+            song = None   # Already settled (e.g. confirmed by the webhook): leave it alone
+        if song:
+            song['status'] = 'failed'
+    if song:
+        publish_song_update(song)
+
+
+def _mark_failed_quietly(data_id):
+    """_mark_failed for cleanup after an unexpected error: only touches songs still 'queued', and a storage error
+    here must not hide the original exception."""
+    try:
+        _mark_failed(data_id, only_if_queued=True)
+    except sqlite3.Error:
+        app.logger.exception("Could not mark song %s as failed", data_id)
+
+
+# Micro-batching of BaaS submissions
+# Songs registered within BATCH_WINDOW_SECONDS of each other are sent in one POST to the batch endpoint,
+# so a burst of registrations costs one round-trip instead of one per song.
+# If the batch POST is rejected, its songs are sent one POST each; for BATCH_UNSUPPORTED_STATUSES we also stop batching.
+BATCH_URL = f"{TASK_URL}/batch"
+BATCH_MAX_ITEMS = 50
+BATCH_WINDOW_SECONDS = 0.1
+BATCH_UNSUPPORTED_STATUSES = [400, 404, 405, 422]   # Batch endpoint missing or rejects our body: stop trying it
+_baas_queue = queue.Queue()
+_batch_supported = True
+_batcher_thread = None
+_batcher_lock = threading.Lock()
+
+# Submission leases: every queued song this process still has to send (in _baas_queue, the pool backlog or mid-POST)
+# is in _in_flight, and the batcher renews their leases every LEASE_RENEW_SECONDS. Songs whose lease expired belong
+# to a process that died, and are taken over and sent by whichever worker notices first.
+SUBMIT_LEASE_SECONDS = 180
+LEASE_RENEW_SECONDS = 60
+_in_flight = set()
+_in_flight_lock = threading.Lock()
+
+# Fields of a stored song that make up the on-chain jsonPayload (the rest is local tracking info).
+SONG_PAYLOAD_FIELDS = ("application", "version", "title", "url", "price", "owner", "timestamp")
+
+
+def build_baas_payload(data_id, song):
+    """Prepare BaaS API payload according to their specification."""
+    return {
+        "dataSchemaName": "songRegistry",  # Table/schema name from sender perspective
+        "dataId": data_id,                 # Row ID from sender perspective
+        "jsonPayload": {field: song[field] for field in SONG_PAYLOAD_FIELDS if field in song}   # The actual data to be hashed and stored
+    }
+
+
+def _ensure_batcher():
+    """Start the batcher thread on first use (after gunicorn forks, never in the master), and restart it if it died."""
+    global _batcher_thread
+    if _batcher_thread is None or not _batcher_thread.is_alive():
+        with _batcher_lock:
+            if _batcher_thread is None or not _batcher_thread.is_alive():
+                if _batcher_thread is not None:
+                    app.logger.error("BaaS batcher thread had stopped, restarting it")
+                _batcher_thread = threading.Thread(target=_batcher, name="blockapi_batcher", daemon=True)
+                _batcher_thread.start()
+
+
+def enqueue_for_baas(data_id, payload):
+    """Queue a song for (batched) submission to BaaS."""
+    _ensure_batcher()
+    with _in_flight_lock:
+        _in_flight.add(data_id)
+    _baas_queue.put((data_id, payload))
+
+
+def _settled(data_id):
+    """The song is no longer waiting to be sent by this process: stop renewing its lease."""
+    with _in_flight_lock:
+        _in_flight.discard(data_id)
+
+
+def _maintain_leases():
+    """Renew the leases on this process's queued songs, then take over songs whose lease ran out."""
+    with _in_flight_lock:
+        mine = list(_in_flight)
+    if mine:
+        renew_leases(mine, SUBMIT_LEASE_SECONDS)
+    for song in claim_expired_songs(SUBMIT_LEASE_SECONDS):
+        if song["data_id"] in mine:
+            continue
+        app.logger.info("Resubmitting song %s left queued by an earlier process", song["data_id"])
+        enqueue_for_baas(song["data_id"], build_baas_payload(song["data_id"], song))
+
+
+def _batcher():
+    """Collect queued songs for up to BATCH_WINDOW_SECONDS (or BATCH_MAX_ITEMS) and hand each batch to the I/O pool."""
+    next_maintenance = 0.0   # Runs straight away, picking up songs left behind before this process started
+    while True:
+        # Nothing may escape this loop: an error here (e.g. "database is locked" during the lease sweep)
+        # would otherwise stop all submissions in this worker until it is restarted.
+        if time.monotonic() >= next_maintenance:
+            next_maintenance = time.monotonic() + LEASE_RENEW_SECONDS
+            try:
+                _maintain_leases()
+            except Exception:
+                app.logger.exception("BaaS lease maintenance failed, retrying in %ss", LEASE_RENEW_SECONDS)
+        batch = []
+        try:
+            # Sleep until there is something to send (or the leases are due)
+            batch.append(_baas_queue.get(timeout=max(next_maintenance - time.monotonic(), 0)))
+            deadline = time.monotonic() + BATCH_WINDOW_SECONDS
+            while len(batch) < BATCH_MAX_ITEMS:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(_baas_queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            baas_executor.submit(submit_batch_to_baas, batch).add_done_callback(_log_task_failure)
+        except queue.Empty:
+            continue
+        except Exception:
+            app.logger.exception("BaaS batcher could not hand off %s song(s)", len(batch))
+            for data_id, _ in batch:
+                _mark_failed_quietly(data_id)   # Not sent, so don't leave them 'queued'
+
+
+def _log_task_failure(future):
+    """Log unexpected errors from BaaS pool tasks; otherwise they would vanish silently inside the Future."""
+    error = future.exception()
+    if error is not None:
+        app.logger.error("BaaS submission task crashed", exc_info=error)
+
+
+def submit_batch_to_baas(batch):
+    """Send a list of (data_id, payload) in one POST, falling back to single POSTs if the batch request is rejected."""
+    try:
+        _submit_batch(batch)
+    except Exception:
+        # Unexpected error (logged by _log_task_failure): don't leave any song of the batch 'queued'
+        for data_id, _ in batch:
+            _mark_failed_quietly(data_id)
+        raise
+
+
+def _submit_batch(batch):
+    global _batch_supported
+    if len(batch) > 1 and _batch_supported:
+        try:
+            with session.post(
+                BATCH_URL,
+                data=orjson.dumps({"items": [payload for _, payload in batch]}),
+                timeout=BAAS_TIMEOUT,
+                stream=True
+            ) as response:
+
+                if response.status_code in [200, 201]:
+                    try:
+                        response_data = orjson.loads(response.content)
+                    except orjson.JSONDecodeError:
+                        response_data = {}
+                    tasks = response_data.get('data') if isinstance(response_data, dict) else None
+                    # Results come back in the same order as the items we sent.
+                    # A 2xx means BaaS accepted every item, so nothing is re-sent (that would write it on-chain twice):
+                    # songs without a returned task ID are marked submitted without one and settled by the webhook.
+                    if not isinstance(tasks, list) or len(tasks) != len(batch):
+                        # Reply shape we don't understand: keep these songs, but stop batching rather than guess again.
+                        _batch_supported = False
+                        app.logger.warning("Unexpected batch response for %d songs; sending songs one at a time from now on", len(batch))
+                        tasks = []
+                    for i, (data_id, _) in enumerate(batch):
+                        task = tasks[i] if i < len(tasks) and isinstance(tasks[i], dict) else {}
+                        _mark_submitted(data_id, task.get('id'))
+                    return
+
+                # Any other answer: send the songs one at a time instead of failing them all.
+                # 400/404/405/422 mean the batch endpoint is missing or doesn't take this body, so stop using it.
+                elif response.status_code in BATCH_UNSUPPORTED_STATUSES:
+                    _batch_supported = False
+                    app.logger.info("BaaS batch endpoint unusable (%s); sending songs one at a time", response.status_code)
+                else:
+                    app.logger.warning("BaaS batch request failed: %s - %s; sending %d songs one at a time", response.status_code, _error_snippet(response), len(batch))
+
+        except requests.RequestException as e:
+            app.logger.warning("Network error submitting batch of %d songs: %s", len(batch), e)
+            for data_id, _ in batch:
+                _mark_failed(data_id)
+            return
+
+    for data_id, payload in batch:
+        submit_to_baas(data_id, payload)
+
+
+@app.before_request
+def _start_batcher():
+    """Start this worker's BaaS batcher on its first request, not at import, so shells and tests never POST to BaaS.
+
+    Its first lease pass also sends songs a previous process left 'queued'.
+    """
+    _ensure_batcher()
 
 
 @app.route("/register_song", methods=["POST"])
 def register_song():
     # Get form data
+    title = request.form.get("title")
+    url = request.form.get("url")
+    price = request.form.get("price", type=int)   # None if missing or not a whole number (no exception raised)
+    owner = request.form.get("owner")
+
+    if price is None or price < 0:
+        flash("Invalid price: please enter a whole number of microALGOs", "error")
+        return redirect("/")
+
+    # Validate owner address/ basic Algorand address validation
+    # Length + base32 alphabet check rejects malformed addresses before they cost a BaaS round-trip.
+    if not owner or len(owner) != ALGORAND_ADDRESS_LENGTH or not _ALGO_CHARS.issuperset(owner):
+        flash("Please provide a valid Algorand address (58 characters, A-Z and 2-7)", "error")
+        return redirect("/")
+
+    # Generate unique identifiers for tracking / Generate unique IDs
+    data_id = f"song_{uuid.uuid4().hex}"  # Random ID, unique even for songs registered in the same second
+
+    # Prepare song data for blockchain
+    song_data = {
+        "application": "songRegistry",
+        "version": 4,
+        "title": title,
+        "url": url,
+        "price": price,
+        "owner": owner,  # Use the address provided by user
+        "timestamp": datetime.now(timezone.utc).isoformat() + "Z" # timestamp format 
+    }
+
+    payload = build_baas_payload(data_id, song_data)
+
+    # Save the song straight away with a queued status, then queue it for (batched) submission to BaaS.
+    # A copy is stored so the tracking fields never leak into the payload that gets hashed on-chain.
+    # Only storage errors are turned into a message; anything else is a bug and should surface as a 500.
     try:
-        title = request.form.get("title")
-        url = request.form.get("url")
-        price = int(request.form.get("price"))
-        owner = request.form.get("owner")
-
-        # Validate owner address/ basic Algorand address validation
-        if not owner or len(owner) != 58:
-            flash("Please provide a valid Algorand address (58 characters)", "error")
-            return redirect("/")
-
-        # Generate unique identifiers for tracking / Generate unique IDs
-        import time
-        song_id = len(songs) + 1  # Local tracking
-        data_id = f"song_{int(time.time())}"  # Use timestamp for unique ID
-
-        # Prepare song data for blockchain
-        song_data = {
-            "application": "songRegistry",
-            "version": 4,
-            "title": title,
-            "url": url,
-            "price": price,
-            "owner": owner,  # Use the address provided by user
-            "timestamp": datetime.now(timezone.utc).isoformat() + "Z" # timestamp format 
-        }
-
-        # Prepare BaaS API payload according to their specification
-        payload = {
-            "dataSchemaName": "songRegistry",  # Table/schema name from sender perspective
-            "dataId": data_id,                 # Row ID from sender perspective
-            "jsonPayload": song_data           # The actual data to be hashed and stored
-        }
-
-        # Try different header formats - blockapi.co.za might use different auth
-        headers = {
-            "X-API-Key": BLOCKAPI_API_KEY,  # Common API key format
-            "Content-Type": "application/json"
-        }
-
-        # Send request to correct BaaS API endpoint
-        response = requests.post(
-            f"{BLOCKAPI_BASE_URL}/blockchainTask",
-            json=payload,
-            headers=headers,
-            timeout=30
-        )
-
-        # Handle response
-        if response.status_code in [200, 201]:  # Accept both 200 and 201 as success
-            # Parse the response to get BaaS task ID
-            response_data = response.json()
-            baas_task_id = response_data.get('data', {}).get('id')
-
-            # Add to local storage for display with tracking info
-            song_data['id'] = song_id
-            song_data['data_id'] = data_id
-            song_data['baas_task_id'] = baas_task_id
-            song_data['status'] = 'pending' 
-            songs.append(song_data)    #Saves song locally with a pending status until the blockchain confirms
-            flash(f"Song registered successfully! Tracking ID: {data_id}", "success")
-            flash(f"BaaS Task ID: {baas_task_id} - Your song will be written to the blockchain shortly.", "info")
-        else:
-            flash(f"Error: {response.status_code} - {response.text}", "error")
-
-    except Exception as e:
+        add_song(dict(song_data, data_id=data_id, baas_task_id=None, status='queued',
+                      lease_until=time.time() + SUBMIT_LEASE_SECONDS))   # Held by this process until it is sent
+    except sqlite3.Error as e:
+        app.logger.exception("Could not save song %s", data_id)
         flash(f"Error registering song: {e}", "error")
+        return redirect("/")
+    enqueue_for_baas(data_id, payload)
+
+    flash(f"Song submitted! Tracking ID: {data_id}", "success")
+    flash("Your song is queued and will be written to the blockchain shortly.", "info")
 
     return redirect("/")
 
+# Webhook outcome -> song status, and the flat payload's "status" string -> outcome.
+_STATUS_MAP = {True: "confirmed", False: "failed"}
+_STATUS_FLAGS = {"success": True, "failed": False}
+
+
+def _webhook_result(webhook_data):
+    """Pull (success flag, transaction ID, explorer URL) out of a webhook.
+
+    BaaS either sends a BlockchainResults list (we use the first entry) or a flat notification
+    with status/transactionId at the top level. The success flag is None when the outcome isn't known yet.
+    """
+    results = webhook_data.get("BlockchainResults")
+    if isinstance(results, list) and results and isinstance(results[0], dict):
+        source = results[0]
+    else:
+        source = webhook_data
+    # Only a real bool / string is looked up; anything else (dicts, lists, numbers...) is an unknown outcome.
+    success_flag = source.get("isSuccess")      # True/False
+    if not isinstance(success_flag, bool):
+        status = webhook_data.get("status")
+        success_flag = _STATUS_FLAGS.get(status) if isinstance(status, str) else None
+    return success_flag, source.get("transactionId"), source.get("transactionExplorerUrl")
+
+
 # Receive blockchain updates
 # whenever someone sends a POST request to /webhook/blockchain-notification, run the function below
 # This function listens for blockchain updates → finds the correct song → updates its status and blockchain info → and confirms back to the webhook sender.
@@ -111,52 +649,49 @@ def blockchain_webhook():    # the function that will run when the webhook is tr
         
         # If no data came in (or it wasn’t JSON), we stop right away and return an error message.
         # 400 = bad request.
-        if not webhook_data:
-            print("Webhook error: no JSON body")
+        if not webhook_data or not isinstance(webhook_data, dict):
+            app.logger.warning("Webhook error: no JSON object body")
             return jsonify({"error": "Invalid webhook"}), 400
 
         # logs what we got, for debugging.
-        print(f"Received webhook: {webhook_data}")
-
-        data_id = webhook_data.get("dataId")       
-        results = webhook_data.get("BlockchainResults", [])   # A list of blockchain transaction results, If BlockchainResults isn’t there, just give an empty list.
-
-        # Prepare 3 empty variables to store info if we find it later:
-        tx_id = None            # blockchain transaction ID.
-        explorer_url = None     # link to see the transaction on a blockchain explorer.
-        success_flag = None     # whether it succeeded or failed.
-
-        # If results isn’t empty, take the first item in the list and pull out:
-        # isInstance - This ensures that results is actually a Python list object.
-        if results and isinstance(results, list):
-            first = results[0]
-            tx_id = first.get("transactionId")
-            explorer_url = first.get("transactionExplorerUrl")
-            success_flag = first.get("isSuccess")      # True/False
-
-        # Update your in-memory songs list
-        # Go through your list of songs in memory.
-        for song in songs:
-            if song.get("data_id") == data_id:   # If a song has the same data_id as the webhook dataId, then update that song.
-                if success_flag is True:
-                    song["status"] = "confirmed"
-                elif success_flag is False:
-                    song["status"] = "failed"
-                else:
-                    song.setdefault("status", "pending")
+        app.logger.debug("Received webhook: %s", webhook_data)
+
+        # Fast path: notifications for other schemas, or without a (string) dataId, can't match any of our songs.
+        # Bail out before walking BlockchainResults or touching the database.
+        schema = webhook_data.get("dataSchemaName")
+        # 204: BaaS only looks at the status code, so success responses carry no body.
+        if schema is not None and schema != "songRegistry":
+            return "", 204
+        data_id = webhook_data.get("dataId")
+        if not data_id or not isinstance(data_id, str):   # Our IDs are strings; a list/dict can't match and would break the SQL bind
+            return "", 204
+
+        # Works for both notification shapes (BlockchainResults list or flat status/transactionId).
+        success_flag, tx_id, explorer_url = _webhook_result(webhook_data)
+
+        # Update the stored song
+        # Look the song up by its data_id (the webhook dataId) via the unique index.
+        with editing_song(data_id) as song:
+            if song:
+                # Unknown outcome keeps whatever status the song already has.
+                song["status"] = _STATUS_MAP.get(success_flag, song.get("status") or "pending")
 
                 if tx_id:
                     song["blockchain_tx_id"] = tx_id
                 if explorer_url:
                     song["explorer_url"] = explorer_url
 
-                print(f"Updated song {data_id}: {song}")
-                break
+                app.logger.debug("Updated song %s: %s", data_id, song)
+
+        # Push the new status to open browsers (after the change is committed)
+        if song:
+            publish_song_update(song)
 
-        return jsonify({"message": "Webhook processed successfully"}), 200
+        return "", 204   # Processed; errors below still return a JSON body
 
-    except Exception as e:
-        print(f"Webhook exception: {e}")
+    # Storage trouble: answer 500 with a JSON body so BaaS can retry; other errors are bugs and go to Flask's 500 handler.
+    except sqlite3.Error as e:
+        app.logger.exception("Webhook storage error")
         return jsonify({"error": str(e)}), 500
 
 
@@ -169,9 +704,7 @@ def verify_transaction():
         json_payload_str = request.form.get("jsonPayload")
         json_payload_hash = request.form.get("jsonPayloadHash")
         
-        print(f"Verifying - TX ID: {transaction_id}")
-        print(f"Payload String: {json_payload_str}")
-        print(f"Hash: {json_payload_hash}")
+        app.logger.debug("Verifying - TX ID: %s, payload string: %s, hash: %s", transaction_id, json_payload_str, json_payload_hash)
         
         # Validate required fields
         if not transaction_id:
@@ -179,12 +712,6 @@ def verify_transaction():
             return redirect(url_for("verify_transaction"))
         
         try:
-            # Use same authentication as registration
-            headers = {
-                "X-API-Key": BLOCKAPI_API_KEY,
-                "Content-Type": "application/json"
-            }
-            
             # Build verification payload exactly as API expects
             # Every verification request needs the transaction ID
             verification_payload = {
@@ -196,9 +723,10 @@ def verify_transaction():
             if json_payload_str and json_payload_str.strip():
                 try:
                     # Parse the JSON string into an object
+                    # stdlib json, not orjson: orjson would silently turn integers beyond 64 bits into floats and change the payload
                     json_payload_obj = json.loads(json_payload_str)        # Parses JSON string into Python object (dict/list)
                     verification_payload["jsonPayload"] = json_payload_obj       # Adds the parsed object to the verification payload
-                    print(f"Parsed JSON payload: {json_payload_obj}")
+                    app.logger.debug("Parsed JSON payload: %s", json_payload_obj)
                 except json.JSONDecodeError as e: 
                     flash(f"Invalid JSON payload format: {str(e)}", "error")          # str(e): Converts exception to readable error message and "error" is for category
                     return redirect(url_for("verify_transaction"))
@@ -207,47 +735,60 @@ def verify_transaction():
             if json_payload_hash and json_payload_hash.strip():
                 verification_payload["jsonPayloadHash"] = json_payload_hash      # No parsing needed since hash is just a string
             
-            print(f"Sending verification request: {verification_payload}")        # Everything that will be sent to the API
+            # Same transaction + payload + hash verified recently? Answer from the cache instead of calling BaaS again.
+            cache_key = (
+                transaction_id,
+                json.dumps(verification_payload.get("jsonPayload"), sort_keys=True),
+                verification_payload.get("jsonPayloadHash", ""),
+            )
+            with verify_cache_lock:
+                cached_result = verify_cache.get(cache_key)
+            if cached_result is not None:
+                flash("Transaction verification completed!", "success")
+                return render_template("verify_transaction.html", 
+                                     tx_id=transaction_id, 
+                                     result=cached_result)
+
+            app.logger.debug("Sending verification request: %s", verification_payload)        # Everything that will be sent to the API
             
             # Send request to the exact endpoint
             # Uses base URL + specific endpoint path
-            response = requests.post(
-                f"{BLOCKAPI_BASE_URL}/blockchainTransaction/verify",
-                json=verification_payload,
-                headers=headers,
-                timeout=30
-            )
-            
-            print(f"Response status: {response.status_code}")
-            print(f"Response text: {response.text}")
-            
-            if response.status_code == 200:
-                try:
-                    result = response.json()              # Parses response body as JSON into Python object
-                    flash("Transaction verification completed!", "success")
+            # Same pooled session and authentication as registration
+            with session.post(
+                VERIFY_URL,
+                data=json.dumps(verification_payload).encode(),   # stdlib json again, so big integers go out exactly as typed
+                timeout=BAAS_TIMEOUT,
+                stream=True
+            ) as response:
+
+                app.logger.debug("Response status: %s", response.status_code)
+
+                if response.status_code == 200:
+                    if app.logger.isEnabledFor(logging.DEBUG):   # Only decode the body for the log when it will actually be written
+                        app.logger.debug("Response text: %s", response.text)
+                    try:
+                        result = orjson.loads(response.content)              # Parses response body as JSON into Python object
+                        flash("Transaction verification completed!", "success")
+                    except orjson.JSONDecodeError:                 # Non-JSON Response Fallback/ API returned 200 but response isn't valid JSON
+                        flash(f"Verification response: {response.text}", "success")
+                        result = {"raw_response": response.text}          # Wraps raw text in a dictionary for template compatibility
+                    with verify_cache_lock:
+                        verify_cache[cache_key] = result
                     return render_template("verify_transaction.html", 
                                          tx_id=transaction_id, 
                                          result=result)
-                except json.JSONDecodeError:                 # Non-JSON Response Fallback/ API returned 200 but response isn't valid JSON
-                    flash(f"Verification response: {response.text}", "success")
-                    return render_template("verify_transaction.html", 
-                                         tx_id=transaction_id, 
-                                         result={"raw_response": response.text})          # Wraps raw text in a dictionary for template compatibility
-            else:
-                error_msg = f"Verification failed. Status: {response.status_code} - {response.text}"
-                flash(error_msg, "error")
-                print(f"Verification failed: {error_msg}")
+                else:
+                    # Only read a capped snippet of the error body
+                    error_msg = f"Verification failed. Status: {response.status_code} - {_error_snippet(response)}"
+                    flash(error_msg, "error")
+                    app.logger.warning("Verification failed: %s", error_msg)
 
         # Exception Handling
         # Network Errors
         except requests.RequestException as e:
             flash(f"Network error during verification: {str(e)}", "error")
-            print(f"Request exception: {e}")
-            
-        # General Errors
-        except Exception as e:
-            flash(f"Unexpected error during verification: {str(e)}", "error")
-            print(f"General exception: {e}")
+            app.logger.warning("Request exception: %s", e)
+        # Anything else is a bug and is left to Flask's 500 handler rather than shown as a flash message.
 
         return redirect(url_for("verify_transaction"))
 